@@ -1,14 +1,44 @@
 import numpy as np
 import pytetgen as pytet
-from sklearn import neighbors
+from scipy.spatial import ConvexHull, cKDTree
+from multiprocessing import Pool, cpu_count
+import hashlib
 
-def fitData(sourceCoord,sourceVal,targetID,targetIndex,targetCoord):
+def fitData(sourceCoord,sourceVal,targetID,targetIndex,targetCoord,tiles=None,halo=None,processes=None,
+            hullIndex=None,project=False):
     """Fit point cloud data from a neutronics mesh onto FEA mesh nodes for
     thermostructural simulations.  Interpolation uses Delaunay triangularization
     with a Barycentric interpolation.  Any nodes external to the triangularization
     (due to coordinate rounding) are then extrapolated using a distance weighting of the
     3 nearest neighbors.
     
+    For very large source clouds the triangularization can be split into a
+    grid of spatial tiles (see 'tiles').  Each tile triangulates only the
+    source points inside its box plus a surrounding halo, and each target node
+    is interpolated by the one tile whose box contains it.  A tile's
+    tetrahedron is only used if its circumsphere lies inside the tile box plus
+    halo: no source point left out of the tile can then be inside the sphere,
+    so the tetrahedron is also in the full triangularization.  Targets that
+    fail this test, or that a tile misses although they are inside the convex
+    hull of the source cloud, are retried with the halo doubled until it
+    covers the whole cloud.  The result is the same as the single-mesh path,
+    and memory scales with the tile size as long as the tetrahedra are
+    compact (large sliver tetrahedra on a jittered hull can force retries with
+    halos up to the whole cloud).  Tiles with too few (or coplanar) source
+    points to triangulate are retried the same way.
+    
+    The tiles are triangulated in a multiprocessing Pool.  Under the 'spawn'
+    and 'forkserver' start methods (the default on Windows and macOS, and on
+    Linux from Python 3.14) each worker re-imports the calling script, so a
+    script that sets 'tiles' must keep its top-level work under
+    'if __name__ == "__main__":' (or pass processes=1).
+    
+    The extrapolation mostly looks up source points close to the convex hull,
+    so it uses a KD-tree built over that thin shell of points (see HullIndex).
+    The indexes of the last few source clouds are cached and reused by later
+    calls on the same cloud, e.g. different node sets or value fields
+    (see getHullIndex).
+    
     Parameters:
     
     sourceCoord (float): x,y,z coordinates (m) of source point cloud
@@ -16,6 +46,20 @@ def fitData(sourceCoord,sourceVal,targetID,targetIndex,targetCoord):
     targetID (int): Sierra mesh node_id_map
     targetIndex (int): Sierra mesh node index (1 to num_nodes)
     targetCoord (float): Sierra mesh node x,y,z coordinates (m)
+    tiles (int or 3-tuple of int): optional number of tiles along x,y,z.  A
+        single int uses the same count on each axis.  None (default)
+        triangulates the whole source cloud at once.
+    halo (float): starting width (m) of the overlap added around each tile.
+        Defaults to 3 times the mean source point spacing over the bounding
+        box.
+    processes (int): number of worker processes used to triangulate tiles.
+        Defaults to the number of CPUs; 1 runs the tiles serially without a
+        Pool.
+    hullIndex (HullIndex): optional prebuilt index of sourceCoord for the
+        extrapolation.  Defaults to the cached index from getHullIndex.
+    project (bool): if True, nodes outside the triangularization are
+        projected onto the nearest hull facet and interpolated there instead
+        of using the 3 nearest neighbors.
     
     Returns:
     
@@ -29,6 +73,102 @@ def fitData(sourceCoord,sourceVal,targetID,targetIndex,targetCoord):
     
     """
     
+    #
+    # Build Delaunay Tet Mesh(es) from Source Point Cloud and Interpolate
+    #
+    if hullIndex is None and tiles is not None:
+      hullIndex = getHullIndex(sourceCoord)
+    
+    if tiles is None:
+      outMask, outVal, _ = _interpolate(sourceCoord,sourceVal,targetCoord)
+    else:
+      outMask, outVal = _interpolateTiled(sourceCoord,sourceVal,targetCoord,tiles,halo,processes,hullIndex)
+    
+    outCoord = targetCoord[outMask]
+    outID = targetID[outMask]
+    outIndex = targetIndex[outMask]
+    
+    
+    #
+    # Unmatched Nodes - KNN Distance Weighted Averaging (or Hull Projection)
+    #
+    # np.savetxt('unmatched.txt',targetCoord[outMask!=True],delimiter=',')
+    #
+    # (Visual inspection of this node set in ParaView showed it to be the
+    #  outer surface nodes.  There's a rounding problem on node coords
+    #  between Abaqus, Atilla, and Sierra.  Use a distance weighted average
+    #  of the 3 closest neighbors for these elements.)
+    #
+    # https://stackoverflow.com/questions/48312205/find-the-k-nearest-neighbours-of-a-point-in-3d-space-with-python-numpy
+    #
+    outerCoord = targetCoord[outMask!=True]
+    outerID = targetID[outMask!=True]
+    outerIndex = targetIndex[outMask!=True]
+    
+    if np.any(outerIndex):
+      if hullIndex is None:
+        hullIndex = getHullIndex(sourceCoord)
+      if project:
+        outerVal = hullIndex.project(outerCoord,sourceVal)
+      else:
+        outerVal = hullIndex.query(outerCoord,sourceVal)
+    else:
+      # If all target nodes fall inside the source mesh,
+      # then don't perform the KNN distance weighting.
+      outerVal = []
+    
+    #
+    # Join the results from the interpolation and extrapolations
+    # Join everything into 1 array
+    # Sort the array by Sierra node index
+    # 
+    finalIndex = np.hstack((outIndex,outerIndex))
+    finalID = np.hstack((outID,outerID))
+    finalCoord = np.vstack((outCoord,outerCoord))
+    finalVal = np.hstack((outVal,outerVal))
+    
+    #final = np.column_stack([finalIndex, finalID, finalCoord, finalVal])
+    #final[final[:,0].argsort()]
+    
+    final = np.empty(len(finalIndex), dtype=([('Index', int), 
+                                          ('ID', int), 
+                                          ('x', float), 
+                                          ('y', float), 
+                                          ('z', float), 
+                                          ('Val', float)]))
+    
+    final['Index'] = finalIndex
+    final['ID'] = finalID
+    final['x'] = finalCoord[:,0]
+    final['y'] = finalCoord[:,1]
+    final['z'] = finalCoord[:,2]
+    final['Val'] = finalVal
+    
+    final.sort(order='Index')
+    
+    return final
+
+
+
+def _spacing(sourceCoord):
+    """Mean point spacing (m) of a source point cloud."""
+    lo = sourceCoord.min(axis=0)
+    hi = sourceCoord.max(axis=0)
+    return (np.prod(hi - lo) / len(sourceCoord))**(1.0/3.0)
+
+
+def _interpolate(sourceCoord,sourceVal,targetCoord,region=None):
+    """Triangulate a source point cloud and interpolate it at the target
+    coordinates with barycentric weights.
+    
+    Returns a boolean mask of the targets that fell inside a tetrahedron, the
+    interpolated values for those targets (in target order), and for those
+    targets whether the tetrahedron is local to 'region'.  'region' is
+    (boxLo, boxHi, cloudLo, cloudHi): a tetrahedron is local if the part of
+    its circumsphere inside the full cloud's bounding box lies inside the box.
+    Without a region every tetrahedron is local.
+    """
+    
     #
     # Build Delaunay Tet Mesh from Source Point Cloud
     #
@@ -37,7 +177,7 @@ def fitData(sourceCoord,sourceVal,targetID,targetIndex,targetCoord):
     # simplex value of -1.  Need to filter these and later
     # determine via some sort of extrapolation.
     tetsRaw = tri.find_simplex(targetCoord)
-    outMask = tetsRaw > 0
+    outMask = tetsRaw >= 0
     tets = tetsRaw[outMask]
     R = targetCoord[outMask]
     
@@ -85,67 +225,471 @@ def fitData(sourceCoord,sourceVal,targetID,targetIndex,targetCoord):
     
     
     #
-    # Calculate Interpolated Target Values with Coordinates and Node ID
+    # Calculate Interpolated Target Values
     #
     outVal = np.multiply(sourceVal[tri.simplices[tets]],bcoords).sum(axis=1)
-    outCoord = targetCoord[outMask]
-    outID = targetID[outMask]
-    outIndex = targetIndex[outMask]
     
     
     #
-    # Unmatched Nodes - KNN Distance Weighted Averaging
+    # Delaunay Locality - Circumsphere of Each Tetrahedron
     #
-    # np.savetxt('unmatched.txt',targetCoord[outMask!=True],delimiter=',')
+    # Center c solves 2(Pi - P0).c = |Pi|^2 - |P0|^2 for i = 1,2,3
     #
-    # (Visual inspection of this node set in ParaView showed it to be the
-    #  outer surface nodes.  There's a rounding problem on node coords
-    #  between Abaqus, Atilla, and Sierra.  Use a distance weighted average
-    #  of the 3 closest neighbors for these elements.)
+    local = np.ones(len(tets), dtype=bool)
+    if region is not None:
+      boxLo, boxHi, cloudLo, cloudHi = region
+      P = sourceCoord[tri.simplices[tets]]
+      A = 2.0*(P[:,1:] - P[:,:1])
+      rhs = (P[:,1:]**2).sum(axis=2) - (P[:,:1]**2).sum(axis=2)
+      center = np.linalg.solve(A, rhs[:,:,np.newaxis])[:,:,0]
+      radius = np.linalg.norm(center - P[:,0], axis=1)[:,np.newaxis]
+      sphereLo = np.maximum(center - radius, cloudLo)
+      sphereHi = np.minimum(center + radius, cloudHi)
+      local = np.all((sphereLo >= boxLo) & (sphereHi <= boxHi), axis=1)
+    
+    return outMask, outVal, local
+
+
+def _interpolateTile(args):
+    """Pool worker: interpolate the targets owned by one tile.  A tile whose
+    source points cannot be triangulated matches none of its targets.
+    """
+    sourceCoord, sourceVal, targetCoord, region = args
+    unmatched = (np.zeros(len(targetCoord), dtype=bool), np.empty(0), np.empty(0, dtype=bool))
+    if len(sourceCoord) < 4 or np.linalg.matrix_rank(sourceCoord - sourceCoord.mean(axis=0)) < 3:
+      return unmatched
+    try:
+      return _interpolate(sourceCoord,sourceVal,targetCoord,region)
+    except (ValueError, RuntimeError, np.linalg.LinAlgError):
+      return unmatched
+
+
+def _interpolateTiled(sourceCoord,sourceVal,targetCoord,tiles,halo,processes,hullIndex):
+    """Split the source cloud into a grid of overlapping tiles, triangulate
+    the tiles independently, and interpolate each target in the tile that
+    owns it.  Returns the same mask and values as _interpolate.
+    """
+    
     #
-    # https://stackoverflow.com/questions/48312205/find-the-k-nearest-neighbours-of-a-point-in-3d-space-with-python-numpy
+    # Tile Grid Over the Source Bounding Box
     #
-    outerCoord = targetCoord[outMask!=True]
-    outerID = targetID[outMask!=True]
-    outerIndex = targetIndex[outMask!=True]
+    # Tiles only overlap by the halo.  Each target is owned by exactly one
+    # tile (targets beyond the source box are clamped into the edge tiles).
+    #
+    nTiles = np.broadcast_to(np.asarray(tiles, dtype=int), (3,))
+    if np.any(nTiles < 1):
+      raise ValueError('tiles must be at least 1 along each axis')
+    if processes is None:
+      processes = cpu_count()
+    if processes < 1:
+      raise ValueError('processes must be at least 1')
+    
+    lo = sourceCoord.min(axis=0)
+    hi = sourceCoord.max(axis=0)
+    size = (hi - lo) / nTiles
+    step = np.where(size > 0, size, 1.0)
+    extent = (hi - lo).max()
+    eps = 1.0e-9*extent   # keeps the locality test clear of round-off at the box faces
+    
+    if halo is None:
+      halo = 3.0*_spacing(sourceCoord)
+    
+    targetTile = np.clip(np.floor((targetCoord - lo) / step).astype(int), 0, nTiles-1)
+    targetTileID = np.ravel_multi_index(targetTile.T, nTiles)
     
-    if np.any(outerIndex):
-      knn = neighbors.KNeighborsRegressor(3, weights='distance')
-      outerVal = knn.fit(sourceCoord,sourceVal).predict(outerCoord)
-    else:
-      # If all target nodes fall inside the source mesh,
-      # then don't perform the KNN distance weighting.
-      knn = []
-      outerVal = []
     
     #
-    # Join the results from the interpolation and extrapolations
-    # Join everything into 1 array
-    # Sort the array by Sierra node index
-    # 
-    finalIndex = np.hstack((outIndex,outerIndex))
-    finalID = np.hstack((outID,outerID))
-    finalCoord = np.vstack((outCoord,outerCoord))
-    finalVal = np.hstack((outVal,outerVal))
+    # Interpolate, Retrying Non-Local and Missed Targets with a Larger Halo
+    #
+    # Once the halo spans the whole cloud every tile holds every source point,
+    # so that pass matches exactly what the single mesh does and the loop ends.
+    #
+    outMask = np.zeros(len(targetCoord), dtype=bool)
+    outVal = np.zeros(len(targetCoord))
+    pending = np.arange(len(targetCoord))
     
-    #final = np.column_stack([finalIndex, finalID, finalCoord, finalVal])
-    #final[final[:,0].argsort()]
+    pool = Pool(processes) if processes > 1 else None
+    try:
+      while len(pending) > 0:
+        found, local, vals = _tilePass(pool,processes,sourceCoord,sourceVal,targetCoord[pending],
+                                       targetTileID[pending],nTiles,lo,hi,size,step,halo,eps)
+        accept = found & local
+        outMask[pending[accept]] = True
+        outVal[pending[accept]] = vals[accept]
+        if halo >= extent:
+          break
+        
+        inside = hullIndex._planeDist(targetCoord[pending]) <= eps
+        pending = pending[(found & ~local) | (~found & inside)]
+        halo = max(2.0*halo, size.max())
+    finally:
+      if pool is not None:
+        pool.terminate()
     
-    final = np.empty(len(finalIndex), dtype=([('Index', int), 
-                                          ('ID', int), 
-                                          ('x', float), 
-                                          ('y', float), 
-                                          ('z', float), 
-                                          ('Val', float)]))
+    return outMask, outVal[outMask]
+
+
+def _tilePass(pool,processes,sourceCoord,sourceVal,targetCoord,targetTileID,nTiles,lo,hi,size,step,halo,eps):
+    """One pass of the tiled interpolation with a given halo.  Returns, for
+    each target, whether a tile found it, whether that tetrahedron is local
+    to the tile, and the interpolated value.
+    """
     
-    final['Index'] = finalIndex
-    final['ID'] = finalID
-    final['x'] = finalCoord[:,0]
-    final['y'] = finalCoord[:,1]
-    final['z'] = finalCoord[:,2]
-    final['Val'] = finalVal
+    #
+    # Bin Targets and Sources by Tile (Once per Pass)
+    #
+    # Each target goes to the single tile containing it.  A source point goes
+    # to every tile whose box plus halo contains it, i.e. tiles
+    # iMin..iMax along each axis.  The (tile, point) pairs are sorted by tile
+    # so each tile's points are one slice found with searchsorted.
+    #
+    targetOrder = np.argsort(targetTileID, kind='stable')
+    targetTileID = targetTileID[targetOrder]
     
-    final.sort(order='Index')
+    sourceMin = np.clip(np.ceil((sourceCoord - lo - halo) / step - 1).astype(int), 0, nTiles-1)
+    sourceMax = np.clip(np.floor((sourceCoord - lo + halo) / step).astype(int), 0, nTiles-1)
+    span = (sourceMax - sourceMin).max(axis=0) + 1
+    pairTile = []
+    pairPoint = []
+    for offset in np.ndindex(*span):
+      ijk = sourceMin + offset
+      inside = np.flatnonzero(np.all(ijk <= sourceMax, axis=1))
+      pairTile.append(np.ravel_multi_index(ijk[inside].T, nTiles))
+      pairPoint.append(inside)
+    pairTile = np.concatenate(pairTile)
+    sourceOrder = np.concatenate(pairPoint)[np.argsort(pairTile, kind='stable')]
+    pairTile = np.sort(pairTile)
     
-    return final
+    
+    #
+    # Triangulate and Interpolate the Tiles in Parallel
+    #
+    # Tiles are handed out one batch per worker at a time so only a batch of
+    # tile point sets is held in memory at once.
+    #
+    found = np.zeros(len(targetCoord), dtype=bool)
+    local = np.zeros(len(targetCoord), dtype=bool)
+    vals = np.zeros(len(targetCoord))
+    
+    tileIDs = np.unique(targetTileID)
+    targetStart = np.searchsorted(targetTileID, tileIDs, side='left')
+    targetEnd = np.searchsorted(targetTileID, tileIDs, side='right')
+    sourceStart = np.searchsorted(pairTile, tileIDs, side='left')
+    sourceEnd = np.searchsorted(pairTile, tileIDs, side='right')
+    
+    for batch in range(0, len(tileIDs), processes):
+      jobs = []
+      jobTargets = []
+      for tt in range(batch, min(batch+processes, len(tileIDs))):
+        # Source points in the tile box plus halo, targets owned by the tile
+        ijk = np.array(np.unravel_index(tileIDs[tt], nTiles))
+        region = (lo + ijk*size - halo + eps, lo + (ijk+1)*size + halo - eps, lo, hi)
+        points = sourceOrder[sourceStart[tt]:sourceEnd[tt]]
+        targets = targetOrder[targetStart[tt]:targetEnd[tt]]
+        jobs.append((sourceCoord[points], sourceVal[points], targetCoord[targets], region))
+        jobTargets.append(targets)
+      
+      if pool is not None and len(jobs) > 1:
+        results = pool.map(_interpolateTile, jobs)
+      else:
+        results = map(_interpolateTile, jobs)
+      
+      for targets, (tileMask, tileVal, tileLocal) in zip(jobTargets, results):
+        found[targets[tileMask]] = True
+        local[targets[tileMask]] = tileLocal
+        vals[targets[tileMask]] = tileVal
+    
+    return found, local, vals
+
+
+class HullIndex:
+    """Spatial index of the source points on or near the convex hull of a
+    source point cloud, used to extrapolate onto target nodes that fall just
+    outside the Delaunay triangularization.
+    
+    Only source points within 'shell' of the hull are kept in the KD-tree.
+    That answers the nearest neighbor search exactly for targets outside or
+    near the hull.  Targets deeper inside the hull (e.g. nodes in a concave
+    notch that a tile of the tiled mode could not match) are detected and
+    looked up in a KD-tree over the full cloud, built only when first needed.
+    The index stores point numbers rather than values, so one index serves
+    every value field defined on the same source coordinates.
+    
+    Parameters:
+    
+    sourceCoord (float): x,y,z coordinates (m) of source point cloud
+    shell (float): thickness (m) of the shell of source points kept inside
+        the hull.  Defaults to 3 times the mean source point spacing.
+    workers (int): number of threads used for KD-tree queries (-1 uses all
+        CPUs)
+    """
+    
+    def __init__(self,sourceCoord,shell=None,workers=-1):
+        if shell is None:
+          shell = 3.0*_spacing(sourceCoord)
+        self.sourceCoord = sourceCoord
+        self.shell = shell
+        self.workers = workers
+        
+        #
+        # Distance from each source point to the hull is the smallest
+        # distance to any facet plane (the plane normals point outward, so
+        # inside the hull -(n.x + d) >= 0).
+        #
+        # Rather than testing every point against every plane, refine an
+        # octree over the bounding box.  At each level a cell keeps only the
+        # planes (from its parent's list) that can come within the shell
+        # anywhere in the cell.  Cells with no planes left are deeper than the
+        # shell and are dropped.  Each point is then tested exactly against
+        # just the planes kept for its finest level cell (about 64 points).
+        #
+        hull = ConvexHull(sourceCoord)
+        self.normals = hull.equations[:,:3]
+        self.offsets = hull.equations[:,3]
+        
+        lo = sourceCoord.min(axis=0)
+        hi = sourceCoord.max(axis=0)
+        levels = max(0, int(np.ceil(np.log2((len(sourceCoord)/64.0)**(1.0/3.0)))))
+        
+        pairCell = np.zeros((len(self.offsets),3), dtype=int)   # (i,j,k) of the cell
+        pairPlane = np.arange(len(self.offsets))
+        children = np.indices((2,2,2)).reshape(3,-1).T
+        for level in range(1, levels+1):
+          cellSize = (hi - lo) / 2**level
+          pairCell = (2*pairCell[:,np.newaxis] + children).reshape(-1,3)
+          pairPlane = np.repeat(pairPlane, 8)
+          centers = lo + (pairCell + 0.5)*cellSize
+          bound = np.einsum('ij,ij->i', centers, self.normals[pairPlane]) + self.offsets[pairPlane] \
+                  + np.abs(self.normals[pairPlane]) @ (0.5*cellSize)
+          near = bound >= -shell
+          pairCell = pairCell[near]
+          pairPlane = pairPlane[near]
+        
+        # Points and (cell, plane) pairs of the finest level, sorted by cell
+        nCells = np.full(3, 2**levels)
+        cellSize = (hi - lo) / nCells
+        cell = np.clip(np.floor((sourceCoord - lo) / np.where(cellSize > 0, cellSize, 1.0)).astype(int), 0, nCells-1)
+        cellID = np.ravel_multi_index(cell.T, nCells)
+        pointOrder = np.argsort(cellID, kind='stable')
+        pointBounds = np.searchsorted(cellID[pointOrder], np.arange(np.prod(nCells)+1))
+        
+        pairCellID = np.ravel_multi_index(pairCell.T, nCells)
+        order = np.argsort(pairCellID, kind='stable')
+        pairCellID = pairCellID[order]
+        pairPlane = pairPlane[order]
+        nearCells = np.unique(pairCellID)
+        planeBounds = np.searchsorted(pairCellID, np.r_[nearCells, nearCells+1]).reshape(2,-1).T
+        
+        # Exact test of each point against its cell's planes
+        shellMask = np.zeros(len(sourceCoord), dtype=bool)
+        for cc, (first, last) in zip(nearCells, planeBounds):
+          points = pointOrder[pointBounds[cc]:pointBounds[cc+1]]
+          if len(points) == 0:
+            continue
+          planes = pairPlane[first:last]
+          dist = sourceCoord[points] @ self.normals[planes].T + self.offsets[planes]
+          shellMask[points] = dist.max(axis=1) >= -shell
+        
+        self.shellPoints = np.flatnonzero(shellMask)
+        self.tree = cKDTree(sourceCoord[self.shellPoints])
+        self.fullTree = None
+        self.facets = None
+    
+    def _planeDist(self,coord):
+        """Largest signed distance from each point to the hull facet planes:
+        positive outside the hull, minus the depth below the surface inside.
+        Works through the points in chunks to bound the (points x facets)
+        temporary array.
+        """
+        chunk = max(1, 2**24 // len(self.offsets))
+        planeDist = np.empty(len(coord))
+        for ii in range(0, len(coord), chunk):
+          planeDist[ii:ii+chunk] = (coord[ii:ii+chunk] @ self.normals.T + self.offsets).max(axis=1)
+        return planeDist
+    
+    def query(self,targetCoord,sourceVal,k=3):
+        """Distance weighted average of the k nearest source points.  A target
+        that coincides with source points takes the average of those points.
+        """
+        dist, near = self.tree.query(targetCoord, k=k, workers=self.workers)
+        dist = dist.reshape(len(targetCoord), -1)
+        near = self.shellPoints[near.reshape(len(targetCoord), -1)]
+        
+        #
+        # Any source point deeper than the shell is at least
+        # shell + planeDist away from the target (it lies that far across the
+        # target's nearest facet plane).  If the k-th shell neighbor is not
+        # closer than that, redo the search over the full cloud.
+        #
+        deep = np.flatnonzero(dist[:,-1] > self.shell + self._planeDist(targetCoord))
+        if len(deep) > 0:
+          if self.fullTree is None:
+            self.fullTree = cKDTree(self.sourceCoord)
+          deepDist, deepNear = self.fullTree.query(targetCoord[deep], k=k, workers=self.workers)
+          dist[deep] = deepDist.reshape(len(deep), -1)
+          near[deep] = deepNear.reshape(len(deep), -1)
+        
+        vals = sourceVal[near]
+        exact = dist == 0.0
+        with np.errstate(divide='ignore'):
+          weights = np.where(exact.any(axis=1)[:,np.newaxis], exact, 1.0/dist)
+        
+        return (weights*vals).sum(axis=1) / weights.sum(axis=1)
+    
+    def project(self,targetCoord,sourceVal,candidates=8,chunk=4096):
+        """Project each target outside the hull onto the nearest triangular
+        facet of the hull and interpolate linearly across that facet.  Targets
+        inside the hull fall back to query.
+        
+        The 'candidates' facets with the nearest centroids give each target a
+        first distance d.  A facet of radius r (largest centroid to vertex
+        distance) can only be closer if its centroid is within d + r, so the
+        facets are grouped by radius and each group is searched with a ball
+        of its own largest radius.  Targets are handled 'chunk' at a time to
+        bound the temporary arrays.
+        """
+        if self.facets is None:
+          self._buildFacets()
+        
+        outVal = np.empty(len(targetCoord))
+        outside = self._planeDist(targetCoord) > 0.0
+        if not outside.all():
+          outVal[~outside] = self.query(targetCoord[~outside],sourceVal)
+        
+        k = min(candidates, len(self.facets))
+        outsideIndex = np.flatnonzero(outside)
+        for ii in range(0, len(outsideIndex), chunk):
+          todo = outsideIndex[ii:ii+chunk]
+          R = targetCoord[todo]
+          
+          # First guess from the nearest centroids
+          near = self.facetTree.query(R, k=k, workers=self.workers)[1].reshape(len(todo), -1)
+          pairTarget = np.repeat(np.arange(len(todo)), near.shape[1])
+          bestDist, bestFacet, bestBary = self._nearestFacet(R, pairTarget, near.ravel(), len(todo))
+          
+          # Every facet that might still be closer, group by group
+          for groupRadius, groupFacets, groupTree in self.facetGroups:
+            balls = groupTree.query_ball_point(R, bestDist + groupRadius, workers=self.workers)
+            counts = np.fromiter(map(len, balls), dtype=int, count=len(todo))
+            if counts.sum() == 0:
+              continue
+            pairTarget = np.repeat(np.arange(len(todo)), counts)
+            pairFacet = groupFacets[np.concatenate([b for b in balls if len(b) > 0]).astype(int)]
+            dist, facet, bary = self._nearestFacet(R, pairTarget, pairFacet, len(todo))
+            closer = dist < bestDist
+            bestDist[closer] = dist[closer]
+            bestFacet[closer] = facet[closer]
+            bestBary[closer] = bary[closer]
+          
+          outVal[todo] = (bestBary*sourceVal[self.facets[bestFacet]]).sum(axis=1)
+        
+        return outVal
+    
+    def _nearestFacet(self,R,pairTarget,pairFacet,numTargets):
+        """Closest of the (target, facet) pairs for each target: distance,
+        facet number and barycentric weights.  Targets without a pair get an
+        infinite distance.
+        """
+        verts = self.sourceCoord[self.facets[pairFacet]]     # (pairs, 3 nodes, xyz)
+        bcoords = _closestOnTriangle(R[pairTarget], verts[:,0], verts[:,1], verts[:,2])
+        proj = np.einsum('ij,ijk->ik', bcoords, verts)
+        dist = np.linalg.norm(R[pairTarget] - proj, axis=-1)
+        
+        order = np.lexsort((dist, pairTarget))
+        first = order[np.unique(pairTarget[order], return_index=True)[1]]
+        
+        bestDist = np.full(numTargets, np.inf)
+        bestFacet = np.zeros(numTargets, dtype=int)
+        bestBary = np.zeros((numTargets, 3))
+        bestDist[pairTarget[first]] = dist[first]
+        bestFacet[pairTarget[first]] = pairFacet[first]
+        bestBary[pairTarget[first]] = bcoords[first]
+        return bestDist, bestFacet, bestBary
+    
+    def _buildFacets(self):
+        # Triangulate the shell points and keep the faces that belong to only
+        # one tetrahedron.  Unlike the Qhull facets, these include the source
+        # points lying on flat faces of the hull (e.g. a rectilinear grid).
+        tri = pytet.Delaunay(self.sourceCoord[self.shellPoints])
+        faces = tri.simplices[:,[[0,1,2],[0,1,3],[0,2,3],[1,2,3]]].reshape(-1,3)
+        faces = np.sort(faces, axis=1)
+        faces, counts = np.unique(faces, axis=0, return_counts=True)
+        self.facets = self.shellPoints[faces[counts == 1]]
+        centroids = self.sourceCoord[self.facets].mean(axis=1)
+        self.facetTree = cKDTree(centroids)
+        
+        # Group the facets by radius in factors of 2, each with its own
+        # centroid tree, so a few large facets don't widen every search
+        radius = np.linalg.norm(self.sourceCoord[self.facets] - centroids[:,np.newaxis], axis=-1).max(axis=1)
+        group = np.floor(np.log2(radius / radius.min())).astype(int)
+        self.facetGroups = []
+        for gg in np.unique(group):
+          groupFacets = np.flatnonzero(group == gg)
+          self.facetGroups.append((radius[groupFacets].max(), groupFacets, cKDTree(centroids[groupFacets])))
+
+
+def _closestOnTriangle(P,A,B,C):
+    """Barycentric coordinates (weights of A, B, C) of the point on each
+    triangle ABC closest to P, checking the vertex, edge, and face regions.
+    From Ericson, Real-Time Collision Detection, section 5.1.5.
+    """
+    dot = lambda u, v: (u*v).sum(axis=-1)
+    AB = B - A
+    AC = C - A
+    d1 = dot(AB, P - A)
+    d2 = dot(AC, P - A)
+    d3 = dot(AB, P - B)
+    d4 = dot(AC, P - B)
+    d5 = dot(AB, P - C)
+    d6 = dot(AC, P - C)
+    va = d3*d6 - d5*d4
+    vb = d5*d2 - d1*d6
+    vc = d1*d4 - d3*d2
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+      vAB = d1 / (d1 - d3)
+      wAC = d2 / (d2 - d6)
+      wBC = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+      vFace = vb / (va + vb + vc)
+      wFace = vc / (va + vb + vc)
+    
+    zero = np.zeros_like(d1)
+    one = np.ones_like(d1)
+    regions = [(d1 <= 0) & (d2 <= 0),                            # vertex A
+               (d3 >= 0) & (d4 <= d3),                           # vertex B
+               (vc <= 0) & (d1 >= 0) & (d3 <= 0),                # edge AB
+               (d6 >= 0) & (d5 <= d6),                           # vertex C
+               (vb <= 0) & (d2 >= 0) & (d6 <= 0),                # edge AC
+               (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0)]      # edge BC
+    v = np.select(regions, [zero, one, vAB, zero, zero, 1.0 - wBC], vFace)
+    w = np.select(regions, [zero, zero, zero, one, wAC, wBC], wFace)
+    return np.stack((1.0 - v - w, v, w), axis=-1)
+
+
+_hullIndexCache = {}
+hullIndexCacheSize = 3
+
+def getHullIndex(sourceCoord,shell=None):
+    """Return the HullIndex of a source point cloud, building it only the
+    first time a given set of coordinates (and shell) is seen.  The
+    fitData.hullIndexCacheSize most recently used indexes are kept (enough for
+    scripts that alternate between a few source clouds); set it to 0 to turn
+    the cache off, and clearHullIndexCache releases the cached indexes.
+    """
+    sourceCoord = np.ascontiguousarray(sourceCoord, dtype=float)
+    key = (hashlib.sha1(sourceCoord.tobytes()).hexdigest(), sourceCoord.shape, shell)
+    if key in _hullIndexCache:
+      # Move to the most recently used end
+      index = _hullIndexCache.pop(key)
+    else:
+      index = HullIndex(sourceCoord,shell)
+    if hullIndexCacheSize > 0:
+      _hullIndexCache[key] = index
+    while len(_hullIndexCache) > max(hullIndexCacheSize, 0):
+      del _hullIndexCache[next(iter(_hullIndexCache))]
+    return index
+
 
+def clearHullIndexCache():
+    """Release the HullIndexes cached by getHullIndex."""
+    _hullIndexCache.clear()
@@ -0,0 +1,184 @@
+"""
+Fatigue screening of the elemental stress histories saved by sierraExport.py.
+Reduces the stress tensor at each element integration point to a signed von
+Mises equivalent stress, rainflow counts the resulting time history, and sums
+Miner's rule damage from a Basquin S-N curve.  Saves the damage, the largest
+cycle stress range, and the number of counted cycles for every element and
+integration point in binary numpy format.
+
+The per time step stress files are memory mapped and read one chunk of
+elements at a time, so the full stress history never needs to fit in memory.
+Rainflow counting is vectorized across all integration points in a chunk and
+the chunks are distributed over a pool of processes.
+
+Change Log:
+
+2026-10-19
+  --> Original issue
+
+"""
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from multiprocessing import Pool
+
+
+def equivalentStress(S):
+    """Signed von Mises equivalent stress.
+
+    Parameters:
+
+    S (float): stress tensors with the components [xx, yy, zz, xy, zx, yz]
+        along the last axis (sierraExport.py column order)
+
+    Returns:
+
+    von Mises stress carrying the sign of the hydrostatic stress, so that
+    tension-compression reversals still appear as cycles in the history
+    """
+    xx, yy, zz, xy, zx, yz = np.moveaxis(S, -1, 0)
+    vm = np.sqrt(0.5*((xx-yy)**2 + (yy-zz)**2 + (zz-xx)**2) + 3.0*(xy**2 + zx**2 + yz**2))
+    return np.where(xx + yy + zz < 0.0, -vm, vm)
+
+
+def rainflow(signal, snC, snM):
+    """Rainflow count many stress histories at once and accumulate Miner's
+    rule damage.  Uses the four point rainflow algorithm, advancing all rows
+    through time together.  Residual half cycles left on the stack at the end
+    of the history are counted as half cycles.
+
+    Parameters:
+
+    signal (float): (rows, time steps) array of equivalent stress histories
+    snC (float): Basquin S-N coefficient, cycles to failure N = snC * range**(-snM)
+    snM (float): Basquin S-N exponent
+
+    Returns:
+
+    damage (float): Miner's rule damage for each row
+    maxRange (float): largest counted cycle stress range for each row
+    cycles (float): number of counted cycles for each row (half cycles as 0.5)
+    """
+    numRows, numTimes = signal.shape
+    rows = np.arange(numRows)
+
+    stack = np.zeros((numRows, numTimes))
+    top = np.zeros(numRows, dtype=int)   # number of points on each stack
+
+    damage = np.zeros(numRows)
+    maxRange = np.zeros(numRows)
+    cycles = np.zeros(numRows)
+
+    for jj in range(numTimes):
+        x = signal[:, jj]
+
+        # Keep only reversals: a point that continues in the same direction
+        # (or repeats the first point) replaces the top of the stack.
+        last = stack[rows, np.maximum(top-1, 0)]
+        prev = stack[rows, np.maximum(top-2, 0)]
+        extend = ((top >= 2) & ((last - prev)*(x - last) >= 0.0)) | ((top == 1) & (x == last))
+        top[~extend] += 1
+        stack[rows, top-1] = x
+
+        # Extract closed cycles: the inner range of the last four points is
+        # a full cycle if it is no larger than both neighbouring ranges.
+        while True:
+            cand = np.flatnonzero(top >= 4)
+            k = top[cand]
+            s1 = stack[cand, k-4]
+            s2 = stack[cand, k-3]
+            s3 = stack[cand, k-2]
+            s4 = stack[cand, k-1]
+            inner = np.abs(s3 - s2)
+            closed = (inner <= np.abs(s2 - s1)) & (inner <= np.abs(s4 - s3))
+            if not closed.any():
+                break
+            cand = cand[closed]
+            inner = inner[closed]
+            damage[cand] += inner**snM / snC
+            maxRange[cand] = np.maximum(maxRange[cand], inner)
+            cycles[cand] += 1.0
+            stack[cand, top[cand]-3] = s4[closed]
+            top[cand] -= 2
+
+    # Residue - each remaining range is a half cycle
+    residue = np.abs(np.diff(stack, axis=1))
+    residue[np.arange(numTimes-1) >= (top-1)[:, np.newaxis]] = 0.0
+    damage += 0.5*(residue**snM).sum(axis=1) / snC
+    maxRange = np.maximum(maxRange, residue.max(axis=1, initial=0.0))
+    cycles += 0.5*np.maximum(top-1, 0)
+
+    return damage, maxRange, cycles
+
+
+def fatigueChunk(args):
+    """Pool worker: fatigue analysis of elements first:last.  Reads the chunk
+    from every time step file and writes its results into the output maps.
+    """
+    filename, numTimes, numIP, first, last, snC, snM = args
+
+    # (time steps, integration points) equivalent stress history of the
+    # chunk, reducing each step's tensors as they are read
+    history = np.empty((numTimes, (last-first)*numIP))
+    for jj in range(numTimes):
+        step = np.load(filename+'_'+str(jj).zfill(3)+'.npy', mmap_mode='r')
+        history[jj] = equivalentStress(step[first*numIP:last*numIP])
+
+    signal = history.T
+    damage, maxRange, cycles = rainflow(signal, snC, snM)
+
+    for name, result in (('damage', damage), ('range', maxRange), ('cycles', cycles)):
+        out = np.load(filename+'_'+name+'.npy', mmap_mode='r+')
+        out[first:last] = result.reshape(-1, numIP)
+        out.flush()
+        del out
+
+    return last - first
+
+
+if __name__ == '__main__':
+
+    # set element type
+    numIP = 4
+
+    # Basquin S-N curve, N = snC * (stress range [Pa])**(-snM)
+    snC = 1.0e52
+    snM = 5.0
+
+    # elements read per chunk and number of worker processes
+    chunkSize = 2000
+    numProcesses = None   # None uses all CPUs
+
+
+    # read the sierraExport.py summary file
+    filename = 'LasagnaOpt_Dynamic_Shroud_Pulses'
+    with open(filename+'.npy', 'rb') as f:
+        eleIDs = np.load(f)
+        blkDict = np.load(f, allow_pickle=True)
+        timeArray = np.load(f)
+
+    numTimes = len(timeArray)
+    numElem = eleIDs.size
+
+
+    # preallocate the output maps on disk (element, integration point)
+    for name in ('damage', 'range', 'cycles'):
+        out = open_memmap(filename+'_'+name+'.npy', mode='w+', dtype=float, shape=(numElem, numIP))
+        del out
+
+
+    # rainflow count the element chunks in parallel
+    jobs = [(filename, numTimes, numIP, first, min(first+chunkSize, numElem), snC, snM)
+            for first in range(0, numElem, chunkSize)]
+
+    with Pool(numProcesses) as pool:
+        done = 0
+        for count in pool.imap_unordered(fatigueChunk, jobs):
+            done += count
+            print('Processed', done, 'of', numElem, 'elements')
+
+
+    # summary
+    damage = np.load(filename+'_damage.npy', mmap_mode='r')
+    worst = np.unravel_index(np.argmax(damage), damage.shape)
+    print('Maximum damage', damage[worst], 'at element', eleIDs.ravel()[worst[0]], 'integration point', worst[1]+1)